@@ -5,14 +5,18 @@ A Model Context Protocol server where a human responds to tool calls via a web i
 """
 
 import asyncio
-import json
+import gzip
+import hashlib
 import logging
-from datetime import datetime
+import os
+import secrets
+import time
 from typing import Any, Dict, List, Optional
-from threading import Thread
-import uuid
 
-from flask import Flask, render_template_string, request, jsonify
+import orjson
+from quart import Quart, Response, request
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.server.stdio import stdio_server
@@ -22,12 +26,33 @@ from mcp.types import Tool, TextContent
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global request queue and responses
+# Web interface port; each MCP client runs its own server process, so run
+# extra instances on distinct ports (e.g. behind a reverse proxy)
+WEB_PORT = int(os.environ.get('HUMAN_MCP_PORT', '5001'))
+
+# Global request queue and the futures awaiting each response. All state below
+# is only touched from the event loop thread, and serialization never awaits,
+# so handlers read it directly without locks or snapshots.
 pending_requests: Dict[str, Dict[str, Any]] = {}
-completed_responses: Dict[str, Any] = {}
+response_futures: Dict[str, asyncio.Future] = {}
+
+# Queues of open /events streams, one per browser tab, each holding at most
+# the latest frame not yet sent
+subscribers: List[asyncio.Queue] = []
+
+# Bumped on every change to pending_requests so long-polling clients can wait;
+# state_changed is set and replaced with a fresh event on each change
+state_version = 0
+state_changed = asyncio.Event()
+
+# Distinguishes this process in ETags, since state_version restarts at zero
+STATE_EPOCH = secrets.token_hex(4)
+
+# Scheduled flush of recent changes to waiting clients, if any
+flush_handle: Optional[asyncio.TimerHandle] = None
 
-# Flask app for web interface
-app = Flask(__name__)
+# Quart app for web interface, served on the same event loop as the MCP server
+app = Quart(__name__)
 
 # HTML template (single file as requested)
 HTML_TEMPLATE = '''<!DOCTYPE html>
@@ -318,7 +343,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         </div>
         
         <div class="requests-container" id="requestsContainer">
-            <div class="empty-state">
+            <div class="empty-state" id="emptyState">
                 <div class="empty-state-icon">⏳</div>
                 <div class="empty-state-text">Waiting for Claude to make a request...</div>
             </div>
@@ -328,7 +353,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
     <script>
         let pendingCount = 0;
         let completedCount = 0;
-        let currentRequestIds = new Set();
+        const renderedCards = new Map();
         
         function showNotification(message) {
             const notif = document.getElementById('notification');
@@ -344,91 +369,80 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             document.getElementById('completedCount').textContent = completedCount;
         }
         
+        function applyRequests(requests) {
+            pendingCount = Object.keys(requests).length;
+            updateCounts();
+            renderRequests(requests);
+        }
+        
         function formatTime(timestamp) {
-            const date = new Date(timestamp);
+            const date = new Date(timestamp * 1000);
             return date.toLocaleTimeString();
         }
         
+        function createCard(requestId, reqData) {
+            const card = document.createElement('div');
+            card.id = `card-${requestId}`;
+            card.className = 'request-card';
+            card.innerHTML = `
+                <div class="request-header">
+                    <div class="request-title">🔧 ${reqData.tool_name}</div>
+                    <div class="request-time">${formatTime(reqData.timestamp)}</div>
+                </div>
+                
+                <div class="request-details">
+                    <div class="detail-row">
+                        <span class="detail-label">Request ID:</span>
+                        <span class="detail-value">${requestId}</span>
+                    </div>
+                    <div class="detail-row">
+                        <span class="detail-label">Tool:</span>
+                        <span class="detail-value">${reqData.tool_name}</span>
+                    </div>
+                    <div class="detail-row">
+                        <span class="detail-label">Parameters:</span>
+                    </div>
+                    <div class="params-json">${JSON.stringify(reqData.arguments, null, 2)}</div>
+                </div>
+                
+                <div class="response-section">
+                    <label for="response-${requestId}">Your Response:</label>
+                    <textarea id="response-${requestId}" placeholder="Type your response here..."></textarea>
+                    
+                    <div class="button-group">
+                        <button class="btn-submit" onclick="submitResponse('${requestId}', false)">
+                            ✓ Submit Response
+                        </button>
+                        <button class="btn-error" onclick="submitResponse('${requestId}', true)">
+                            ✗ Return Error
+                        </button>
+                    </div>
+                </div>
+            `;
+            return card;
+        }
+        
         function renderRequests(requests) {
             const container = document.getElementById('requestsContainer');
-            const requestIds = Object.keys(requests);
-            
-            // If no requests, show empty state
-            if (requestIds.length === 0) {
-                if (currentRequestIds.size > 0) {
-                    // Had requests before, now empty - clear everything
-                    container.innerHTML = `
-                        <div class="empty-state">
-                            <div class="empty-state-icon">⏳</div>
-                            <div class="empty-state-text">Waiting for Claude to make a request...</div>
-                        </div>
-                    `;
-                    currentRequestIds.clear();
-                }
-                return;
-            }
-            
-            // Check if this is the first request (empty state needs to be cleared)
-            if (currentRequestIds.size === 0 && requestIds.length > 0) {
-                container.innerHTML = '';
-            }
             
             // Remove cards for requests that no longer exist
-            for (const oldId of currentRequestIds) {
-                if (!requests[oldId]) {
-                    const oldCard = document.getElementById(`card-${oldId}`);
-                    if (oldCard) {
-                        oldCard.remove();
-                    }
-                    currentRequestIds.delete(oldId);
+            for (const [requestId, card] of renderedCards) {
+                if (!(requestId in requests)) {
+                    card.remove();
+                    renderedCards.delete(requestId);
                 }
             }
             
-            // Add cards for new requests
+            // Add cards for new requests; existing cards (and typed responses) are left alone
             for (const [requestId, reqData] of Object.entries(requests)) {
-                if (!currentRequestIds.has(requestId)) {
-                    const card = document.createElement('div');
-                    card.id = `card-${requestId}`;
-                    card.className = 'request-card';
-                    card.innerHTML = `
-                        <div class="request-header">
-                            <div class="request-title">🔧 ${reqData.tool_name}</div>
-                            <div class="request-time">${formatTime(reqData.timestamp)}</div>
-                        </div>
-                        
-                        <div class="request-details">
-                            <div class="detail-row">
-                                <span class="detail-label">Request ID:</span>
-                                <span class="detail-value">${requestId}</span>
-                            </div>
-                            <div class="detail-row">
-                                <span class="detail-label">Tool:</span>
-                                <span class="detail-value">${reqData.tool_name}</span>
-                            </div>
-                            <div class="detail-row">
-                                <span class="detail-label">Parameters:</span>
-                            </div>
-                            <div class="params-json">${JSON.stringify(reqData.arguments, null, 2)}</div>
-                        </div>
-                        
-                        <div class="response-section">
-                            <label for="response-${requestId}">Your Response:</label>
-                            <textarea id="response-${requestId}" placeholder="Type your response here..."></textarea>
-                            
-                            <div class="button-group">
-                                <button class="btn-submit" onclick="submitResponse('${requestId}', false)">
-                                    ✓ Submit Response
-                                </button>
-                                <button class="btn-error" onclick="submitResponse('${requestId}', true)">
-                                    ✗ Return Error
-                                </button>
-                            </div>
-                        </div>
-                    `;
+                if (!renderedCards.has(requestId)) {
+                    const card = createCard(requestId, reqData);
                     container.appendChild(card);
-                    currentRequestIds.add(requestId);
+                    renderedCards.set(requestId, card);
                 }
             }
+            
+            document.getElementById('emptyState').hidden = renderedCards.size > 0;
         }
         
         async function submitResponse(requestId, isError) {
@@ -459,7 +473,6 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                     showNotification(isError ? 'Error response sent!' : 'Response submitted successfully!');
                     completedCount++;
                     updateCounts();
-                    fetchRequests();
                 } else {
                     showNotification('Failed to submit response');
                 }
@@ -469,177 +482,282 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             }
         }
         
-        async function fetchRequests() {
-            try {
-                const response = await fetch('/get_requests');
-                const data = await response.json();
-                
-                pendingCount = Object.keys(data.requests).length;
-                updateCounts();
-                renderRequests(data.requests);
-            } catch (error) {
-                console.error('Error fetching requests:', error);
+        // Long-poll fallback for networks that block Server-Sent Events
+        async function pollRequests() {
+            let version = null;
+            while (true) {
+                try {
+                    const url = version === null ? '/get_requests' : `/get_requests?v=${version}`;
+                    const response = await fetch(url);
+                    const data = await response.json();
+                    
+                    version = data.v;
+                    applyRequests(data.requests);
+                } catch (error) {
+                    console.error('Error fetching requests:', error);
+                    await new Promise(resolve => setTimeout(resolve, 1000));
+                }
             }
         }
         
-        // Poll for new requests every second
-        setInterval(fetchRequests, 1000);
-        
-        // Initial fetch
-        fetchRequests();
+        // Receive pending requests pushed by the server whenever they change
+        const events = new EventSource('/events');
+        events.onmessage = (event) => {
+            applyRequests(JSON.parse(event.data).requests);
+        };
+        events.onerror = () => {
+            // The browser retries dropped streams itself; CLOSED means it gave up
+            if (events.readyState === EventSource.CLOSED) {
+                pollRequests();
+            }
+        };
     </script>
 </body>
 </html>
 '''
 
-# Flask routes
+# The page is static, so encode and compress it once at import time
+INDEX_HTML = HTML_TEMPLATE.encode('utf-8')
+INDEX_GZIP = gzip.compress(INDEX_HTML, compresslevel=9)
+INDEX_ETAG = hashlib.md5(INDEX_HTML).hexdigest()
+INDEX_GZIP_ETAG = INDEX_ETAG + '-gz'
+
+def notify_subscribers():
+    """Record a change to pending_requests and schedule a flush to clients"""
+    global state_version, flush_handle
+    state_version += 1
+    if flush_handle is None:
+        # Coalesce bursts of changes into a single wakeup per client
+        flush_handle = asyncio.get_running_loop().call_later(0.005, flush_subscribers)
+
+def flush_subscribers():
+    """Wake long-polling clients and push the current state to /events streams"""
+    global state_changed, flush_handle
+    flush_handle = None
+    state_changed.set()
+    state_changed = asyncio.Event()
+    
+    frame = sse_frame()
+    for subscriber in subscribers:
+        # A tab that stopped reading only needs the newest state, so replace
+        # any frame it has not picked up yet
+        if subscriber.full():
+            subscriber.get_nowait()
+        subscriber.put_nowait(frame)
+
+def sse_frame() -> bytes:
+    """Encode the pending requests as a single Server-Sent Events frame"""
+    return b"data: " + orjson.dumps({'requests': pending_requests}) + b"\n\n"
+
+def json_response(data: Any) -> Response:
+    """Serialize data to a JSON response with orjson"""
+    return Response(orjson.dumps(data), mimetype='application/json')
+
+# Quart routes
 @app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
+async def index():
+    if 'gzip' in request.accept_encodings:
+        response = Response(INDEX_GZIP, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(INDEX_GZIP_ETAG)
+    else:
+        response = Response(INDEX_HTML, mimetype='text/html')
+        response.set_etag(INDEX_ETAG)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return await response.make_conditional(request)
 
 @app.route('/get_requests')
-def get_requests():
-    return jsonify({'requests': pending_requests})
+async def get_requests():
+    """Pending requests; pass ?v=<version> to wait until they change"""
+    client_version = request.args.get('v', type=int)
+    deadline = asyncio.get_running_loop().time() + 25
+    # A flush may still be pending for a version the client already has, so
+    # keep waiting on each fresh event until the version moves past it
+    while client_version == state_version:
+        timeout = deadline - asyncio.get_running_loop().time()
+        if timeout <= 0:
+            break
+        try:
+            await asyncio.wait_for(state_changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            break
+    
+    etag = f'{STATE_EPOCH}-{state_version}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = json_response({'v': state_version, 'requests': pending_requests})
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/events')
+async def events():
+    """Server-Sent Events stream of pending requests"""
+    async def generate():
+        subscriber = asyncio.Queue(maxsize=1)
+        subscribers.append(subscriber)
+        try:
+            yield sse_frame()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies open and detects closed tabs
+                    yield b": keepalive\n\n"
+                    continue
+                yield frame
+        finally:
+            subscribers.remove(subscriber)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.timeout = None
+    return response
 
 @app.route('/submit_response', methods=['POST'])
-def submit_response():
-    data = request.json
-    request_id = data.get('request_id')
-    response_text = data.get('response')
+async def submit_response():
+    data = orjson.loads(await request.get_data())
+    request_id = data['request_id']
+    response_text = data['response']
     is_error = data.get('is_error', False)
     
-    if request_id in pending_requests:
-        completed_responses[request_id] = {
+    future = response_futures.pop(request_id, None)
+    if future is not None:
+        del pending_requests[request_id]
+        notify_subscribers()
+        future.set_result({
             'response': response_text,
             'is_error': is_error
-        }
-        del pending_requests[request_id]
-        return jsonify({'success': True})
+        })
+        return json_response({'success': True})
     
-    return jsonify({'success': False, 'error': 'Request not found'})
+    return json_response({'success': False, 'error': 'Request not found'}), 404
 
-def run_flask():
-    """Run Flask in a separate thread"""
-    app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False)
+async def run_web():
+    """Serve the web interface with hypercorn until cancelled"""
+    config = Config()
+    config.bind = [f'0.0.0.0:{WEB_PORT}']
+    # Keep idle browser connections open between long-polls and page reloads
+    config.keep_alive_timeout = 120
+    await serve(app, config, shutdown_trigger=asyncio.Event().wait)
 
 # MCP Server
 server = Server("human-controlled-mcp")
 
-@server.list_tools()
-async def handle_list_tools() -> List[Tool]:
-    """List available tools that the human can respond to"""
-    return [
-        Tool(
-            name="ask_human",
-            description="Ask the human operator a question and wait for their response. Use this when you need human input, decision-making, or information that only a human would know.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "question": {
-                        "type": "string",
-                        "description": "The question or request for the human operator"
-                    },
-                    "context": {
-                        "type": "string",
-                        "description": "Additional context to help the human understand what you need"
-                    }
+# Tools are static, so build them once rather than on every list_tools call
+TOOLS = [
+    Tool(
+        name="ask_human",
+        description="Ask the human operator a question and wait for their response. Use this when you need human input, decision-making, or information that only a human would know.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "question": {
+                    "type": "string",
+                    "description": "The question or request for the human operator"
                 },
-                "required": ["question"]
-            }
-        ),
-        Tool(
-            name="human_search",
-            description="Ask the human to search for information. The human will look up the information and provide their findings.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "What the human should search for"
-                    },
-                    "sources": {
-                        "type": "string",
-                        "description": "Suggested sources or where to look (optional)"
-                    }
+                "context": {
+                    "type": "string",
+                    "description": "Additional context to help the human understand what you need"
+                }
+            },
+            "required": ["question"]
+        }
+    ),
+    Tool(
+        name="human_search",
+        description="Ask the human to search for information. The human will look up the information and provide their findings.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "What the human should search for"
                 },
-                "required": ["query"]
-            }
-        ),
-        Tool(
-            name="human_decision",
-            description="Ask the human to make a decision between options. Useful when you need human judgment or preference.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "decision_needed": {
-                        "type": "string",
-                        "description": "What decision needs to be made"
-                    },
-                    "options": {
-                        "type": "string",
-                        "description": "The available options (can be a list or description)"
-                    },
-                    "recommendation": {
-                        "type": "string",
-                        "description": "Your recommendation (optional)"
-                    }
+                "sources": {
+                    "type": "string",
+                    "description": "Suggested sources or where to look (optional)"
+                }
+            },
+            "required": ["query"]
+        }
+    ),
+    Tool(
+        name="human_decision",
+        description="Ask the human to make a decision between options. Useful when you need human judgment or preference.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "decision_needed": {
+                    "type": "string",
+                    "description": "What decision needs to be made"
                 },
-                "required": ["decision_needed", "options"]
-            }
-        )
-    ]
+                "options": {
+                    "type": "string",
+                    "description": "The available options (can be a list or description)"
+                },
+                "recommendation": {
+                    "type": "string",
+                    "description": "Your recommendation (optional)"
+                }
+            },
+            "required": ["decision_needed", "options"]
+        }
+    )
+]
+
+@server.list_tools()
+async def handle_list_tools() -> List[Tool]:
+    """List available tools that the human can respond to"""
+    return TOOLS
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict) -> List[TextContent]:
     """Handle tool calls by queuing them for human response"""
     
-    request_id = str(uuid.uuid4())
+    request_id = secrets.token_hex(8)
+    future = asyncio.get_running_loop().create_future()
     
     # Add to pending requests
+    response_futures[request_id] = future
     pending_requests[request_id] = {
         'tool_name': name,
         'arguments': arguments,
-        'timestamp': datetime.now().isoformat()
+        'timestamp': time.time()
     }
+    notify_subscribers()
     
     logger.info(f"New request queued: {request_id} - {name}")
     
     # Wait for human response (with timeout)
     max_wait = 300  # 5 minutes timeout
-    waited = 0
-    
-    while request_id not in completed_responses and waited < max_wait:
-        await asyncio.sleep(1)
-        waited += 1
     
-    # Get response or timeout
-    if request_id in completed_responses:
-        response_data = completed_responses[request_id]
-        del completed_responses[request_id]
-        
-        if response_data['is_error']:
-            raise Exception(response_data['response'])
-        
-        return [TextContent(
-            type="text",
-            text=response_data['response']
-        )]
-    else:
-        # Timeout - clean up
-        if request_id in pending_requests:
+    try:
+        response_data = await asyncio.wait_for(asyncio.shield(future), timeout=max_wait)
+    except asyncio.TimeoutError:
+        # Timeout, unless a response arrived at the last moment
+        if not future.done():
+            raise Exception("Request timed out - no human response received within 5 minutes")
+        response_data = future.result()
+    finally:
+        # Drop the request if still pending, so timed out or cancelled calls
+        # never leave orphans behind in the web interface
+        if response_futures.pop(request_id, None) is not None:
             del pending_requests[request_id]
-        raise Exception("Request timed out - no human response received within 5 minutes")
-
-async def main():
-    """Main entry point"""
-    # Start Flask in background thread
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
+            notify_subscribers()
     
-    logger.info("Human MCP Server starting...")
-    logger.info("Web interface available at: http://localhost:5001")
-    logger.info("Waiting for MCP client connection via stdio...")
+    if response_data['is_error']:
+        raise Exception(response_data['response'])
     
+    return [TextContent(
+        type="text",
+        text=response_data['response']
+    )]
+
+async def run_mcp():
+    """Serve MCP over stdio until the client disconnects"""
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
@@ -654,5 +772,21 @@ async def main():
             )
         )
 
+async def main():
+    """Main entry point"""
+    logger.info("Human MCP Server starting...")
+    logger.info(f"Web interface available at: http://localhost:{WEB_PORT}")
+    logger.info("Waiting for MCP client connection via stdio...")
+    
+    # The web interface and MCP server share this event loop. When either
+    # stops (the client disconnected, or the port was unavailable) shut down
+    # the other and surface any error.
+    tasks = {asyncio.create_task(run_web()), asyncio.create_task(run_mcp())}
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    for task in done:
+        task.result()
+
 if __name__ == "__main__":
     asyncio.run(main())